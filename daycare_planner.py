@@ -6,7 +6,8 @@ This script reads babysitting appointments from a Google Sheet (with columns
 ``Week nummer``, ``Datum``, ``Oppas`` and ``Comments``) and emails
 iCalendar invites to the babysitters and yourself.  Each invite is
 an all-day event titled ``Oppas – <oppas naam>`` on the specified
-date and includes the comment as the description.
+date and includes the comment as the description.  Rows dated before
+today (in Amsterdam time) are skipped.
 
 The script is intended to run periodically (for example via a GitHub
 Actions workflow) and it does **not** require a Google developer
@@ -47,7 +48,8 @@ The following environment variables must be set for the script to run:
         }
 
     If a babysitter name is present in this mapping, the script will
-    include that email address as an attendee on the invitation.
+    include that email address as an attendee on the invitation.  Names
+    are matched ignoring case and surrounding whitespace.
 
     Values may be either a single email string or a list of strings,
     e.g.::
@@ -72,32 +74,56 @@ install them via::
 
     pip install requests python-dateutil
 
+If ``orjson`` is installed it is used to parse ``EMAIL_MAP``; otherwise
+the standard library ``json`` module is used.
+
 """
 
+import bisect
+import codecs
+import functools
 import json
 import os
+import queue
+import re
+import threading
 import datetime
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
 
 from dateutil import parser as date_parser
 import smtplib
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email import encoders
+from email import policy
+from email.message import EmailMessage
 import uuid
 import requests
 import csv
+import logging
+import sys
+
+# orjson is optional; it parses JSON faster but the standard library
+# works just as well.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP session so connections (and their TLS handshakes) are
+# pooled across requests, including the redirect hops of a CSV export.
+session = requests.Session()
 
 
 def fetch_csv_records(csv_url: str) -> List[Dict[str, Any]]:
     """Download and parse CSV data from a Google Sheet."""
-    response = requests.get(csv_url)
-    response.raise_for_status()
-    # Decode the response content as UTF-8; Google CSVs are typically UTF-8.
-    content = response.content.decode("utf-8")
-    reader = csv.DictReader(content.splitlines())
-    return [row for row in reader]
+    with session.get(csv_url, stream=True) as response:
+        response.raise_for_status()
+        # Decode the lines as UTF-8 while streaming; Google CSVs are
+        # typically UTF-8.
+        reader = csv.DictReader(codecs.iterdecode(response.iter_lines(), "utf-8"))
+        return list(reader)
 
 
 def build_smtp_client(host: str, port: int, username: str, password: str) -> smtplib.SMTP:
@@ -108,63 +134,206 @@ def build_smtp_client(host: str, port: int, username: str, password: str) -> smt
     return client
 
 
+# Number of SMTP connections used to send invites in parallel.  Sending
+# is dominated by server round-trips, so overlapping them saves time.
+SMTP_WORKERS = 8
+
+
+def send_invites(
+    invites: List[Tuple[str, str, List[str], EmailMessage]],
+    host: str,
+    port: int,
+    username: str,
+    password: str,
+) -> None:
+    """Send prepared invites concurrently over a pool of SMTP connections.
+
+    Each invite is a ``(oppas_name, date_str, recipients, message)``
+    tuple.  SMTP clients are not thread-safe, so each connection is used
+    by one worker at a time.  The first connection is opened up front so
+    bad credentials fail once, before any worker starts; further
+    connections are added on demand until one fails to open.
+    """
+    if not invites:
+        return
+
+    clients = [build_smtp_client(host, port, username, password)]
+    idle: "queue.Queue[smtplib.SMTP]" = queue.Queue()
+    idle.put(clients[0])
+    clients_lock = threading.Lock()
+    can_grow = True
+
+    def acquire() -> smtplib.SMTP:
+        nonlocal can_grow
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            pass
+        with clients_lock:
+            if can_grow and len(clients) < SMTP_WORKERS:
+                try:
+                    client = build_smtp_client(host, port, username, password)
+                except Exception as exc:
+                    can_grow = False
+                    logger.warning(
+                        "Could not open another SMTP connection, using %d: %s",
+                        len(clients),
+                        exc,
+                    )
+                else:
+                    clients.append(client)
+                    return client
+        return idle.get()
+
+    def send(invite: Tuple[str, str, List[str], EmailMessage]) -> None:
+        oppas_name, date_str, recipients_list, msg = invite
+        client = acquire()
+        try:
+            client.send_message(msg, from_addr=username, to_addrs=recipients_list)
+            logger.info(
+                "Sent invite for %s on %s to %s", oppas_name, date_str, recipients_list
+            )
+        except Exception as exc:
+            logger.error(
+                "Failed to send invite for %s on %s: %s", oppas_name, date_str, exc
+            )
+        finally:
+            idle.put(client)
+
+    try:
+        with ThreadPoolExecutor(max_workers=SMTP_WORKERS) as executor:
+            list(executor.map(send, invites))
+    finally:
+        for client in clients:
+            try:
+                client.quit()
+            except Exception:
+                client.close()
+
+
+# Formats commonly produced by Google Sheets; tried before falling back
+# to the (much slower) dateutil parser.  DATE_RE below already covers
+# the well-formed variants, so these only catch inputs strptime is more
+# lenient about, such as stray spaces ("2024-03- 5").
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d-%m-%y", "%d/%m/%y")
+
+# Fast path for the same day-first and ISO formats, without strptime's
+# format machinery.
+DATE_RE = re.compile(
+    r"^(?P<d>\d{1,2})[-/](?P<m>\d{1,2})[-/](?P<y>\d{4}|\d{2})$"
+    r"|^(?P<Y>\d{4})-(?P<M>\d{1,2})-(?P<D>\d{1,2})$"
+)
+
+# Dates starting with a four-digit year ("2024/03/05", "20240305") are
+# year-month-day; only the remaining formats are read day-first.
+YEAR_FIRST_RE = re.compile(r"^\d{4}(?:\D|\d{4}$)")
+
+
+@functools.lru_cache(maxsize=None)
 def parse_date(date_str: str) -> datetime.date:
     """Parse a date string into a ``datetime.date``."""
-    dt = date_parser.parse(date_str, dayfirst=True, fuzzy=False)
+    stripped = date_str.strip()
+    # Reject obvious junk cheaply; dateutil can be slow on garbage input.
+    if sum(c.isdigit() for c in stripped) < 4:
+        raise ValueError(f"Not a date: {date_str!r}")
+    match = DATE_RE.match(stripped)
+    if match:
+        if match["Y"]:
+            year, month, day = match["Y"], match["M"], match["D"]
+        else:
+            year, month, day = match["y"], match["m"], match["d"]
+        year_num = int(year)
+        if len(year) == 2:
+            # Same pivot as strptime's %y: 69-99 -> 1900s, 00-68 -> 2000s
+            year_num += 1900 if year_num >= 69 else 2000
+        try:
+            return datetime.date(year_num, int(month), int(day))
+        except ValueError:
+            pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(stripped, fmt).date()
+        except ValueError:
+            pass
+    dayfirst = not YEAR_FIRST_RE.match(stripped)
+    dt = date_parser.parse(date_str, dayfirst=dayfirst, fuzzy=False)
     return dt.date()
 
 
+def parse_dates(date_strs: List[str]) -> List[Optional[datetime.date]]:
+    """Parse a column of date strings, using ``None`` for invalid dates."""
+    parsed: List[Optional[datetime.date]] = []
+    for date_str in date_strs:
+        try:
+            parsed.append(parse_date(date_str))
+        except (ValueError, OverflowError):
+            parsed.append(None)
+    return parsed
+
+
+# iCalendar invite skeleton; ``attendees`` holds zero or more complete
+# ATTENDEE lines, each terminated by CRLF.
+ICS_TEMPLATE = (
+    "BEGIN:VCALENDAR\r\n"
+    "PRODID:-//Daycare Planner//EN\r\n"
+    "VERSION:2.0\r\n"
+    "CALSCALE:GREGORIAN\r\n"
+    "METHOD:REQUEST\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:{uid}\r\n"
+    "DTSTAMP:{dtstamp}\r\n"
+    "DTSTART;VALUE=DATE:{start}\r\n"
+    "DTEND;VALUE=DATE:{end}\r\n"
+    "SUMMARY:Oppas – {oppas_name}\r\n"
+    "DESCRIPTION:{description}\r\n"
+    "ORGANIZER:MAILTO:{organizer_email}\r\n"
+    "{attendees}"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR"
+)
+
+
 def build_ics_event(
-    date_str: str,
+    event_date: datetime.date,
     oppas_name: str,
     description: str,
     organizer_email: str,
     babysitter_emails: List[str],
     user_email: str,
+    dtstamp: str,
+    uid: str,
 ) -> str:
     """Create an iCalendar event string for emailing invitations."""
-    event_date = parse_date(date_str)
     start_date = event_date
     end_date = event_date + datetime.timedelta(days=1)  # all-day event
 
-    dtstamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    uid = f"{uuid.uuid4()}@daycare-planner"
-
-    lines = [
-        "BEGIN:VCALENDAR",
-        "PRODID:-//Daycare Planner//EN",
-        "VERSION:2.0",
-        "CALSCALE:GREGORIAN",
-        "METHOD:REQUEST",
-        "BEGIN:VEVENT",
-        f"UID:{uid}",
-        f"DTSTAMP:{dtstamp}",
-        f"DTSTART;VALUE=DATE:{start_date.strftime('%Y%m%d')}",
-        f"DTEND;VALUE=DATE:{end_date.strftime('%Y%m%d')}",
-        f"SUMMARY:Oppas – {oppas_name}",
-        f"DESCRIPTION:{description}",
-        f"ORGANIZER:MAILTO:{organizer_email}",
-    ]
-
     # Babysitter(s) as attendees
-    for email in babysitter_emails or []:
-        lines.append(
-            f"ATTENDEE;CN={oppas_name};RSVP=TRUE:MAILTO:{email}"
-        )
+    attendees = "".join(
+        f"ATTENDEE;CN={oppas_name};RSVP=TRUE:MAILTO:{email}\r\n"
+        for email in babysitter_emails or []
+    )
 
     # User as attendee (if set and not already in the list)
     if user_email and user_email not in (babysitter_emails or []):
-        lines.append(
-            f"ATTENDEE;CN=Planner User;RSVP=TRUE:MAILTO:{user_email}"
-        )
+        attendees += f"ATTENDEE;CN=Planner User;RSVP=TRUE:MAILTO:{user_email}\r\n"
 
-    lines.extend(
-        [
-            "END:VEVENT",
-            "END:VCALENDAR",
-        ]
+    return ICS_TEMPLATE.format_map(
+        {
+            "uid": uid,
+            "dtstamp": dtstamp,
+            "start": start_date.strftime("%Y%m%d"),
+            "end": end_date.strftime("%Y%m%d"),
+            "oppas_name": oppas_name,
+            "description": description,
+            "organizer_email": organizer_email,
+            "attendees": attendees,
+        }
     )
-    return "\r\n".join(lines)
+
+
+# The schedule is Dutch, so "today" is taken in Amsterdam time rather
+# than the runner's clock (UTC on GitHub Actions).
+SHEET_TIMEZONE = ZoneInfo("Europe/Amsterdam")
 
 
 def main() -> None:
@@ -180,10 +349,13 @@ def main() -> None:
     email_map_str = os.environ.get("EMAIL_MAP", "{}")
     try:
         # Values may be str or list[str], so use Any
-        email_map: Dict[str, Any] = json.loads(email_map_str)
+        email_map: Dict[str, Any] = json_loads(email_map_str)
     except json.JSONDecodeError:
         raise ValueError("EMAIL_MAP environment variable must be valid JSON")
 
+    # Match names regardless of surrounding whitespace or case
+    email_map_norm = {k.strip().casefold(): v for k, v in email_map.items()}
+
     # SMTP configuration
     smtp_host = os.environ.get("SMTP_HOST", "smtp.gmail.com")
     smtp_port = int(os.environ.get("SMTP_PORT", "587"))
@@ -192,28 +364,66 @@ def main() -> None:
     if not smtp_username or not smtp_password:
         raise EnvironmentError("SMTP_USERNAME and SMTP_PASSWORD must be set")
 
+    # One timestamp and random UID prefix per run; a counter keeps the
+    # UIDs of individual events unique.
+    dtstamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    run_id = uuid.uuid4().hex[:16]
+
     # Fetch the CSV data
     records = fetch_csv_records(csv_url)
 
-    smtp_client = build_smtp_client(smtp_host, smtp_port, smtp_username, smtp_password)
-
-    for row in records:
-        date_str = (row.get("Datum") or "").strip()
-        oppas_name = (row.get("Oppas") or "").strip()
-        description = row.get("Comments", "") or ""
+    invites: List[Tuple[str, str, List[str], EmailMessage]] = []
+    seen: Set[Tuple[datetime.date, str]] = set()
 
+    # Process rows in date order and drop those already in the past;
+    # rows without a usable date sort last.
+    event_dates = parse_dates([row.get("Datum") or "" for row in records])
+    dated_rows = sorted(
+        zip(event_dates, records),
+        key=lambda pair: pair[0] or datetime.date.max,
+    )
+    first_upcoming = bisect.bisect_left(
+        [event_date or datetime.date.max for event_date, _ in dated_rows],
+        datetime.datetime.now(SHEET_TIMEZONE).date(),
+    )
+    if first_upcoming:
+        logger.info("Skipping %d row(s) dated in the past", first_upcoming)
+    dated_rows = dated_rows[first_upcoming:]
+
+    # Pull the needed columns out of the row dicts in one pass
+    event_dates = [event_date for event_date, _ in dated_rows]
+    records = [row for _, row in dated_rows]
+    dates = [(row.get("Datum") or "").strip() for row in records]
+    names = [(row.get("Oppas") or "").strip() for row in records]
+    comments = [row.get("Comments", "") or "" for row in records]
+
+    for event_date, date_str, oppas_name, description in zip(
+        event_dates, dates, names, comments
+    ):
         # Skip rows without required fields
         if not date_str or not oppas_name:
-            print("Skipping row missing required fields")
+            logger.info("Skipping row missing required fields")
+            continue
+
+        if event_date is None:
+            logger.info("Skipping row with unrecognised date '%s'", date_str)
             continue
 
         # Skip special values that should not trigger invites
         if oppas_name in ("Nvt", "Nog te plannen"):
-            print(f"Skipping row for oppas '{oppas_name}' (no invite needed)")
+            logger.info("Skipping row for oppas '%s' (no invite needed)", oppas_name)
+            continue
+
+        # Skip rows that repeat an earlier (Datum, Oppas) pair, comparing
+        # parsed dates and names the same way EMAIL_MAP lookups do
+        key = (event_date, oppas_name.casefold())
+        if key in seen:
+            logger.info("Skipping duplicate row for %s on %s", oppas_name, date_str)
             continue
+        seen.add(key)
 
         # Determine babysitter emails from EMAIL_MAP
-        mapped = email_map.get(oppas_name)
+        mapped = email_map_norm.get(oppas_name.casefold())
         if isinstance(mapped, list):
             babysitter_emails = mapped
         elif isinstance(mapped, str):
@@ -227,48 +437,71 @@ def main() -> None:
             recipients.add(user_email)
 
         if not recipients:
-            print(f"No recipients for {oppas_name}; skipping")
+            logger.info("No recipients for %s; skipping", oppas_name)
             continue
 
         # Build the iCalendar event
         ics_content = build_ics_event(
-            date_str=date_str,
+            event_date=event_date,
             oppas_name=oppas_name,
             description=description,
             organizer_email=smtp_username,
             babysitter_emails=babysitter_emails,
             user_email=user_email,
+            dtstamp=dtstamp,
+            uid=f"{run_id}-{len(invites)}@daycare-planner",
         )
 
         recipients_list = list(recipients)
 
         # Build the email message
-        msg = MIMEMultipart("mixed")
+        msg = EmailMessage(policy=policy.SMTP)
         msg["Subject"] = f"Oppas – {oppas_name} ({date_str})"
         msg["From"] = smtp_username
         msg["To"] = ", ".join(recipients_list)
 
         # Plain-text body
-        body = MIMEText("Zie de bijgevoegde kalenderuitnodiging.", "plain", "utf-8")
-        msg.attach(body)
+        msg.set_content("Zie de bijgevoegde kalenderuitnodiging.")
 
         # iCalendar part – this is what makes Gmail show it as a real invite
-        ical = MIMEBase("text", "calendar", method="REQUEST", charset="UTF-8")
-        ical.set_payload(ics_content)
-        encoders.encode_base64(ical)
-        ical.add_header("Content-Disposition", 'attachment; filename="invite.ics"')
-        ical.add_header("Content-Class", "urn:content-classes:calendarmessage")
-        msg.attach(ical)
-
-        # Send the email
-        try:
-            smtp_client.sendmail(smtp_username, recipients_list, msg.as_string())
-            print(f"Sent invite for {oppas_name} on {date_str} to {recipients_list}")
-        except Exception as exc:
-            print(f"Failed to send invite for {oppas_name} on {date_str}: {exc}")
+        msg.add_attachment(
+            ics_content,
+            subtype="calendar",
+            cte="base64",
+            filename="invite.ics",
+            params={"method": "REQUEST"},
+            headers=["Content-Class: urn:content-classes:calendarmessage"],
+        )
+
+        invites.append((oppas_name, date_str, recipients_list, msg))
+
+    # Send the emails
+    send_invites(invites, smtp_host, smtp_port, smtp_username, smtp_password)
 
-    smtp_client.quit()
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """Stream handler that leaves batching of writes to the stream.
+
+    ``logging.StreamHandler`` flushes after every record, which turns
+    each log line into its own ``write()`` on a block-buffered stdout.
+    This handler writes like ``print()`` does: the stream's own buffer
+    decides when data reaches the file, and the handler only flushes
+    when asked to (e.g. by ``logging.shutdown()`` at exit).
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[BufferedStreamHandler(sys.stdout)],
+    )
     main()
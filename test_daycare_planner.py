@@ -0,0 +1,123 @@
+import datetime
+import io
+import logging
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+import daycare_planner
+
+
+def test_parse_date_iso_and_day_first():
+    parse_date = daycare_planner.parse_date
+    assert parse_date("2099-03-06") == datetime.date(2099, 3, 6)
+    assert parse_date("2099-3-6") == datetime.date(2099, 3, 6)
+    assert parse_date("2024/03/05") == datetime.date(2024, 3, 5)
+    assert parse_date("2024.03.05") == datetime.date(2024, 3, 5)
+    assert parse_date("20240305") == datetime.date(2024, 3, 5)
+    assert parse_date("06-03-2099") == datetime.date(2099, 3, 6)
+    assert parse_date("6/3/2099") == datetime.date(2099, 3, 6)
+    assert parse_date("1/1/25") == datetime.date(2025, 1, 1)
+    assert parse_date("1-1-70") == datetime.date(1970, 1, 1)
+    assert parse_date("24 december 2025") == datetime.date(2025, 12, 24)
+
+
+def test_parse_dates_invalid_is_none():
+    assert daycare_planner.parse_dates(
+        ["06-03-2099", "", "today", "31/02/2099"]
+    ) == [datetime.date(2099, 3, 6), None, None, None]
+
+
+def test_send_invites_bad_credentials_log_in_once(monkeypatch):
+    logins = []
+
+    class FailingSMTP:
+        def __init__(self, host, port):
+            pass
+
+        def starttls(self):
+            pass
+
+        def login(self, username, password):
+            logins.append(username)
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+    monkeypatch.setattr(daycare_planner.smtplib, "SMTP", FailingSMTP)
+    invites = [("Opa Piet", "2099-03-06", ["piet@example.com"], EmailMessage())] * 20
+
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        daycare_planner.send_invites(invites, "smtp.example.com", 587, "me", "pw")
+    assert logins == ["me"]
+
+
+def test_send_invites_keeps_going_when_a_connection_fails(monkeypatch):
+    lock = threading.Lock()
+    opened = []
+    sent = []
+    overlaps = []
+
+    class FlakySMTP:
+        def __init__(self, host, port):
+            with lock:
+                if len(opened) == 2:
+                    opened.append(None)
+                    raise OSError("connection refused")
+                opened.append(self)
+            self.busy = False
+            self.quit_called = False
+
+        def starttls(self):
+            pass
+
+        def login(self, username, password):
+            pass
+
+        def send_message(self, msg, from_addr=None, to_addrs=None):
+            if self.busy:
+                overlaps.append(self)
+            self.busy = True
+            time.sleep(0.001)
+            with lock:
+                sent.append(msg["Subject"])
+            self.busy = False
+
+        def quit(self):
+            self.quit_called = True
+
+    monkeypatch.setattr(daycare_planner.smtplib, "SMTP", FlakySMTP)
+    invites = []
+    for i in range(50):
+        msg = EmailMessage()
+        msg["Subject"] = f"invite {i}"
+        invites.append(("Opa Piet", "2099-03-06", ["piet@example.com"], msg))
+
+    daycare_planner.send_invites(invites, "smtp.example.com", 587, "me", "pw")
+
+    clients = [client for client in opened if client is not None]
+    assert sorted(sent) == sorted(f"invite {i}" for i in range(50))
+    assert overlaps == []
+    assert len(opened) == 3
+    assert all(client.quit_called for client in clients)
+
+
+def test_buffered_stream_handler_writes_without_flushing():
+    class Stream(io.StringIO):
+        flushes = 0
+
+        def flush(self):
+            self.flushes += 1
+            super().flush()
+
+    stream = Stream()
+    handler = daycare_planner.BufferedStreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for i in range(3):
+        handler.handle(logging.makeLogRecord({"msg": "line %d", "args": (i,)}))
+
+    assert stream.getvalue() == "line 0\nline 1\nline 2\n"
+    assert stream.flushes == 0
+    handler.flush()
+    assert stream.flushes == 1